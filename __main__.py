@@ -8,8 +8,6 @@ import sys
 from functools import partial
 from pathlib import Path
 
-import nltk
-from nltk import data as nltk_data
 from wyoming.info import Attribution, Info, TtsProgram, TtsVoice
 from wyoming.server import AsyncServer
 
@@ -22,7 +20,8 @@ SCRIPT_DIR = Path(__file__).resolve().parent
 sys.path.insert(0, str(SCRIPT_DIR))
 
 from gladostts.glados import TTSRunner
-from server.handler import GladosEventHandler
+from server.handler import GladosEventHandler, split_sentences, warm_up
+from server.nltk_bootstrap import ensure_nltk
 
 
 async def main() -> None:
@@ -106,13 +105,15 @@ async def main() -> None:
         models_dir=models_dir,
     )
 
-    # Ensure NLTK 'punkt' data is downloaded
-    try:
-        nltk_data.find("tokenizers/punkt_tab")
-        _LOGGER.debug("NLTK 'punkt' tokenizer data is already available.")
-    except LookupError:
-        _LOGGER.debug("Downloading NLTK 'punkt' tokenizer data...")
-        nltk_download("punkt_tab", quiet=not args.debug)
+    # Ensure NLTK tokenizer data is downloaded
+    ensure_nltk(debug=args.debug)
+
+    # Load the sentence tokenizer now rather than on the first request
+    split_sentences("")
+
+    # Run one synthesis up front so the first client does not pay for
+    # lazy kernel selection and tokenizer loading
+    warm_up(glados_tts)
 
     # Start the server
     _LOGGER.info("Starting the GLaDOS TTS server...")
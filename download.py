@@ -3,16 +3,46 @@
 
 import argparse
 import hashlib
+import json
 import logging
-import shutil
+import mmap
+import os
+import queue
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from http.client import HTTPConnection, HTTPSConnection, ImproperConnectionState
 from pathlib import Path
-from typing import Union
-from urllib.parse import quote, urlsplit, urlunsplit
-from urllib.request import urlopen
+from typing import List, Optional, Union
+from urllib.error import HTTPError, URLError
+from urllib.parse import SplitResult, quote, urljoin, urlsplit, urlunsplit
+from urllib.request import Request, getproxies, proxy_bypass, urlopen
 
 DEFAULT_URL = "https://github.com/nalf3in/glados-tts/releases/download/v0.1.0-alpha/{file}"
 DEFAULT_MODEL_DIR = "./gladostts/models"
 
+# List of model files and their expected MD5 checksums
+MODEL_FILES = [
+    {"filename": "glados-new.pt", "md5": "d6945ffd96ee0619d0d49a581b5b83ad"},
+    {"filename": "glados.pt", "md5": "11383a00f7ddfc8f80285ce3aba2ebb0"},
+    {"filename": "en_us_cmudict_ipa_forward.pt", "md5": "33887f7f579f010ce4463534306120b0"},
+    {"filename": "emb/glados_p2.pt", "md5": "ff2ad1438e9acb1f8e8607864c239ffc"},
+    {"filename": "emb/glados_p1.pt", "md5": "e0ffe67a6f53c4ff0b3952fc678946d9"},
+    {"filename": "vocoder-gpu.pt", "md5": "d35c13c01d2cacd348aa216649bbfac3"},
+    {"filename": "vocoder-cpu-hq.pt", "md5": "e8842210dc989e351c2e50614ff55f46"},
+    {"filename": "vocoder-cpu-lq.pt", "md5": "cfd048af8bb8190995eac7b95bf7367e"},
+]
+
+_DOWNLOAD_WORKERS = 4
+_COPY_BUFFER_SIZE = 1 << 20
+
+_TIMEOUT = 60
+# Same User-Agent that urlopen sends
+_HEADERS = {"User-Agent": f"Python-urllib/{sys.version_info[0]}.{sys.version_info[1]}"}
+
+# Per-thread HTTP connections, reused across files from the same host
+_THREAD_LOCAL = threading.local()
+
 _LOGGER = logging.getLogger(__name__)
 
 
@@ -23,22 +53,135 @@ def _quote_url(url: str) -> str:
     return urlunsplit(parts)
 
 
-def get_file_hash(path: Path, bytes_per_chunk: int = 8192) -> str:
-    """Calculate the MD5 hash of a file in chunks."""
-    md5_hash = hashlib.md5()
+def _get_connection(scheme: str, netloc: str) -> HTTPConnection:
+    """Return this thread's kept-alive connection to the given host."""
+    connections = getattr(_THREAD_LOCAL, "connections", None)
+    if connections is None:
+        connections = _THREAD_LOCAL.connections = {}
+    connection = connections.get((scheme, netloc))
+    if connection is None:
+        connection_class = HTTPSConnection if scheme == "https" else HTTPConnection
+        connection = connections[(scheme, netloc)] = connection_class(
+            netloc, timeout=_TIMEOUT
+        )
+    return connection
+
+
+def _close_connections() -> None:
+    """Close all of this thread's kept-alive connections."""
+    connections = getattr(_THREAD_LOCAL, "connections", None)
+    if not connections:
+        return
+    for connection in connections.values():
+        connection.close()
+    connections.clear()
+
+
+def _uses_proxy(parts: SplitResult) -> bool:
+    """Check if urllib would send a request for this URL through a proxy."""
+    return parts.scheme in getproxies() and not proxy_bypass(parts.hostname or "")
+
+
+def _open_url(url: str, max_redirects: int = 5):
+    """Open a URL, reusing this thread's connections to the same hosts.
+
+    Each file costs a TLS handshake with urlopen, and every release download
+    goes through a redirect to the same CDN host, so connections are kept
+    alive across files. Non-HTTP URLs and hosts reached through a proxy
+    are handed to urlopen.
+    """
+    for _ in range(max_redirects + 1):
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or _uses_proxy(parts):
+            return urlopen(Request(url, headers=_HEADERS), timeout=_TIMEOUT)
+
+        path = urlunsplit(("", "", parts.path or "/", parts.query, ""))
+        for attempt in range(2):
+            connection = _get_connection(parts.scheme, parts.netloc)
+            try:
+                connection.request("GET", path, headers=_HEADERS)
+                response = connection.getresponse()
+                break
+            except (ConnectionError, ImproperConnectionState):
+                # The server closed a kept-alive connection; retry on a new one
+                _close_connections()
+                if attempt:
+                    raise
+
+        if response.status in (301, 302, 303, 307, 308):
+            response.read()  # Drain the body so the connection can be reused
+            url = urljoin(url, response.getheader("Location"))
+            continue
+        if response.status != 200:
+            response.read()
+            raise HTTPError(url, response.status, response.reason, response.headers, None)
+        return response
+
+    raise URLError(f"Too many redirects for {url}")
+
+
+def get_file_hash(path: Path) -> str:
+    """Calculate the MD5 hash of a file.
+
+    The file is memory-mapped so hashlib can walk it in C without copying
+    it through Python in chunks.
+    """
     with open(path, "rb") as file:
-        for chunk in iter(lambda: file.read(bytes_per_chunk), b""):
-            md5_hash.update(chunk)
-    return md5_hash.hexdigest()
+        # Empty files cannot be mapped
+        if os.fstat(file.fileno()).st_size == 0:
+            return hashlib.md5().hexdigest()
+
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return hashlib.md5(mapped).hexdigest()
+
+
+def _marker_path(file_path: Path) -> Path:
+    """Return the path of the sidecar file recording a successful validation."""
+    return file_path.with_name(file_path.name + ".md5ok")
+
+
+def _has_valid_marker(file_path: Path, expected_md5: str) -> bool:
+    """Check if a previous validation of the unchanged file is on record."""
+    marker_path = _marker_path(file_path)
+    try:
+        marker = json.loads(marker_path.read_text())
+    except (OSError, ValueError):
+        return False
+
+    stat = file_path.stat()
+    if marker == {
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "md5": expected_md5,
+    }:
+        return True
+
+    # File was modified or the expected hash changed
+    marker_path.unlink(missing_ok=True)
+    return False
+
+
+def _write_marker(file_path: Path, md5_hash: str) -> None:
+    """Record that the file matched its MD5 hash so it can be skipped next time."""
+    stat = file_path.stat()
+    marker = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "md5": md5_hash}
+    try:
+        _marker_path(file_path).write_text(json.dumps(marker))
+    except OSError:
+        _LOGGER.warning("Could not write validation marker for %s.", file_path)
 
 
 def is_valid_file(file_path: Path, expected_md5: str) -> bool:
     """Check if the file exists, is of sufficient size, and matches the MD5 hash."""
     if not file_path.exists():
+        _marker_path(file_path).unlink(missing_ok=True)
         return False
     if file_path.stat().st_size < 1024:
         _LOGGER.warning("File %s is too small.", file_path)
         return False
+    if _has_valid_marker(file_path, expected_md5):
+        _LOGGER.debug("File %s is unchanged since last validation.", file_path)
+        return True
     md5_hash = get_file_hash(file_path)
     if md5_hash != expected_md5:
         _LOGGER.warning(
@@ -48,62 +191,133 @@ def is_valid_file(file_path: Path, expected_md5: str) -> bool:
             md5_hash,
         )
         return False
+    _write_marker(file_path, md5_hash)
     return True
 
 
-def ensure_model_exists(download_dir: Path, base_url: str):
+def download_model(model: dict, model_file_path: Path, base_url: str) -> None:
+    """Download a single model file and verify its MD5 hash."""
+    model_url = base_url.format(file=model["filename"].split("/")[-1])
+
+    # Remove invalid or incomplete file
+    if model_file_path.exists():
+        model_file_path.unlink()
+    _marker_path(model_file_path).unlink(missing_ok=True)
+
+    try:
+        _LOGGER.info("Downloading %s to %s", model_url, model_file_path)
+        # Hash while writing so the file does not have to be read back
+        md5_hash = hashlib.md5()
+        with _open_url(_quote_url(model_url)) as response, open(
+            model_file_path, "wb"
+        ) as out_file:
+            # Reuse one 1 MiB buffer instead of allocating a new block per read
+            buffer = memoryview(bytearray(_COPY_BUFFER_SIZE))
+            for num_bytes in iter(lambda: response.readinto(buffer), 0):
+                out_file.write(buffer[:num_bytes])
+                md5_hash.update(buffer[:num_bytes])
+        _LOGGER.info("Downloaded %s", model_file_path)
+
+        # Verify MD5 hash of the downloaded data
+        if md5_hash.hexdigest() == model["md5"]:
+            _LOGGER.info("Verified MD5 hash for %s.", model_file_path)
+            _write_marker(model_file_path, model["md5"])
+        else:
+            _LOGGER.error(
+                "MD5 hash mismatch after download for %s. Expected %s, got %s.",
+                model_file_path,
+                model["md5"],
+                md5_hash.hexdigest(),
+            )
+            if model_file_path.exists():
+                model_file_path.unlink()
+    except Exception:
+        # The connection may be left mid-response, so do not reuse it
+        _close_connections()
+        _LOGGER.exception(
+            "Failed to download %s from %s",
+            model_file_path,
+            _quote_url(model_url),
+        )
+        if model_file_path.exists():
+            model_file_path.unlink()  # Remove incomplete file
+
+
+def _download_worker(pending: queue.SimpleQueue, base_url: str) -> None:
+    """Download queued model files, reusing this thread's connections."""
+    try:
+        while True:
+            try:
+                model, model_file_path = pending.get_nowait()
+            except queue.Empty:
+                return
+            download_model(model, model_file_path, base_url)
+    finally:
+        _close_connections()
+
+
+def required_models(use_gpu: Optional[bool] = None, use_p1: bool = True) -> List[dict]:
+    """Return the model files needed for the given configuration.
+
+    Args:
+        use_gpu: Only include the GPU (True) or CPU (False) vocoders.
+            None includes the vocoders for both.
+        use_p1: Include the p1 speaker embedding.
+
+    Returns:
+        The model files with their expected MD5 checksums.
+    """
+    models = []
+    for model in MODEL_FILES:
+        filename = model["filename"]
+        if filename == "emb/glados_p1.pt" and not use_p1:
+            continue
+        if filename.startswith("vocoder-") and use_gpu is not None:
+            if (filename == "vocoder-gpu.pt") != use_gpu:
+                continue
+        models.append(model)
+    return models
+
+
+def ensure_model_exists(
+    download_dir: Path, base_url: str, model_files: Optional[List[dict]] = None
+):
     """Ensure that all required model files are present and valid."""
-    # List of model files and their expected MD5 checksums
-    model_files = [
-        {"filename": "glados-new.pt", "md5": "d6945ffd96ee0619d0d49a581b5b83ad"},
-        {"filename": "glados.pt", "md5": "11383a00f7ddfc8f80285ce3aba2ebb0"},
-        {"filename": "en_us_cmudict_ipa_forward.pt", "md5": "33887f7f579f010ce4463534306120b0"},
-        {"filename": "emb/glados_p2.pt", "md5": "ff2ad1438e9acb1f8e8607864c239ffc"},
-        {"filename": "emb/glados_p1.pt", "md5": "e0ffe67a6f53c4ff0b3952fc678946d9"},
-        {"filename": "vocoder-gpu.pt", "md5": "d35c13c01d2cacd348aa216649bbfac3"},
-        {"filename": "vocoder-cpu-hq.pt", "md5": "e8842210dc989e351c2e50614ff55f46"},
-        {"filename": "vocoder-cpu-lq.pt", "md5": "cfd048af8bb8190995eac7b95bf7367e"},
-    ]
+    if model_files is None:
+        model_files = required_models()
 
+    models_to_check = []
     for model in model_files:
-        model_file = model["filename"]
-        model_file_path = download_dir / model_file
+        model_file_path = download_dir / model["filename"]
         model_file_path.parent.mkdir(parents=True, exist_ok=True)
+        models_to_check.append((model, model_file_path))
 
-        if is_valid_file(model_file_path, model["md5"]):
-            _LOGGER.info("File %s is valid.", model_file_path)
-            continue  # No need to download
-
-        # Remove invalid or incomplete file
-        if model_file_path.exists():
-            model_file_path.unlink()
-
-        # Download the file
-        try:
-            filename = model_file.split("/")[-1]
-            model_url = base_url.format(file=filename)
-            _LOGGER.info("Downloading %s to %s", model_url, model_file_path)
-            with urlopen(_quote_url(model_url)) as response, open(
-                model_file_path, "wb"
-            ) as out_file:
-                shutil.copyfileobj(response, out_file)
-            _LOGGER.info("Downloaded %s", model_file_path)
-
-            # Verify MD5 hash after download
-            if is_valid_file(model_file_path, model["md5"]):
-                _LOGGER.info("Verified MD5 hash for %s.", model_file_path)
-            else:
-                _LOGGER.error("MD5 hash mismatch after download for %s.", model_file_path)
-                if model_file_path.exists():
-                    model_file_path.unlink()
-        except Exception:
-            _LOGGER.exception(
-                "Failed to download %s from %s",
+    # Hash existing files in parallel; hashlib releases the GIL while hashing
+    models_to_download = []
+    with ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1)) as executor:
+        futures = {
+            executor.submit(is_valid_file, model_file_path, model["md5"]): (
+                model,
                 model_file_path,
-                _quote_url(model_url),
             )
-            if model_file_path.exists():
-                model_file_path.unlink()  # Remove incomplete file
+            for model, model_file_path in models_to_check
+        }
+        for future in as_completed(futures):
+            model, model_file_path = futures[future]
+            if future.result():
+                _LOGGER.info("File %s is valid.", model_file_path)
+            else:
+                models_to_download.append((model, model_file_path))
+
+    # Downloads are network bound, so fetch the missing files concurrently
+    pending = queue.SimpleQueue()
+    for model, model_file_path in models_to_download:
+        pending.put((model, model_file_path))
+
+    num_workers = min(_DOWNLOAD_WORKERS, len(models_to_download))
+    with ThreadPoolExecutor(max_workers=max(num_workers, 1)) as executor:
+        for _ in range(num_workers):
+            executor.submit(_download_worker, pending, base_url)
 
 
 if __name__ == "__main__":
@@ -120,6 +334,16 @@ if __name__ == "__main__":
         default=DEFAULT_URL,
         help="URL for downloading models",
     )
+    parser.add_argument(
+        "--device",
+        choices=["gpu", "cpu"],
+        help="Only download the vocoder for this device (default: all vocoders)",
+    )
+    parser.add_argument(
+        "--skip-p1",
+        action="store_true",
+        help="Skip the p1 speaker embedding, which the server does not use",
+    )
     parser.add_argument(
         "--debug",
         action="store_true",
@@ -129,4 +353,9 @@ if __name__ == "__main__":
 
     logging.basicConfig(level=logging.DEBUG if args.debug else logging.INFO)
 
-    ensure_model_exists(args.model_dir, args.url)
+    use_gpu = None if args.device is None else args.device == "gpu"
+    ensure_model_exists(
+        args.model_dir,
+        args.url,
+        required_models(use_gpu=use_gpu, use_p1=not args.skip_p1),
+    )
@@ -1,29 +1,67 @@
 """Event handler for clients of the server."""
 
 import argparse
+import asyncio
 import logging
-from typing import Optional
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import aclosing
+from functools import lru_cache
+from typing import AsyncIterator, Optional, Tuple
 
 from wyoming.audio import AudioChunk, AudioStart, AudioStop
+from wyoming.error import Error
 from wyoming.event import Event
 from wyoming.info import Describe, Info
 from wyoming.server import AsyncEventHandler
 from wyoming.tts import Synthesize
 
-import nltk
 from nltk.tokenize import sent_tokenize
-from pydub import AudioSegment
 from gladostts.glados import TTSRunner
 
 _LOGGER = logging.getLogger(__name__)
 
-# Ensure NLTK 'punkt' data is downloaded
-try:
-    nltk.data.find('tokenizers/punkt_tab')
-    _LOGGER.debug("NLTK 'punkt_tab' tokenizer data is already available.")
-except LookupError:
-    _LOGGER.info("Downloading NLTK 'punkt_tab' tokenizer data...")
-    nltk.download('punkt_tab')
+# Single worker so synthesis requests from all clients run one at a time on
+# the GPU, without blocking the event loop
+_TTS_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="glados-tts")
+
+# Audio format announced when there is nothing to synthesize (16-bit mono PCM)
+_DEFAULT_RATE = 22050
+_DEFAULT_WIDTH = 2
+_DEFAULT_CHANNELS = 1
+
+
+@lru_cache(maxsize=512)
+def split_sentences(text: str) -> Tuple[str, ...]:
+    """Split text into sentences, caching results for repeated requests."""
+    return tuple(sent_tokenize(text))
+
+
+def warm_up(glados_tts: TTSRunner) -> None:
+    """Synthesize a short dummy sentence to warm up the TTS engine.
+
+    This runs on the same worker thread as real requests, since part of the
+    torch state (e.g. OpenMP threads, the current CUDA stream) is per thread.
+    """
+    _LOGGER.debug("Warming up GLaDOS TTS engine...")
+    start_time = time.monotonic()
+    try:
+        _TTS_EXECUTOR.submit(glados_tts.run_tts, "warmup.").result()
+    except Exception:
+        _LOGGER.exception("TTS warmup failed")
+        return
+    _LOGGER.info("TTS warmup took %.2f s", time.monotonic() - start_time)
+
+
+@lru_cache(maxsize=None)
+def get_audio_start_event(rate: int, width: int, channels: int) -> Event:
+    """Build the AudioStart event for an audio format once and reuse it.
+
+    The vocoder always produces the same format, so in practice this is
+    only built once per process.
+    """
+    return AudioStart(rate=rate, width=width, channels=channels).event()
+
 
 class GladosEventHandler(AsyncEventHandler):
     def __init__(
@@ -39,29 +77,93 @@ class GladosEventHandler(AsyncEventHandler):
         self.cli_args = cli_args
         self.wyoming_info_event = wyoming_info.event()
         self.glados_tts = glados_tts
+        # Tuple so str.endswith can check all characters at once
+        self._auto_punctuation = tuple(cli_args.auto_punctuation or ())
+
+    def synthesize_sentence(self, sentence: str) -> Tuple[int, int, int, bytes]:
+        """Synthesize a single sentence into raw PCM audio.
 
-    def handle_tts_request(self, text: str, delay: float = 250) -> AudioSegment:
-        """Generate an AudioSegment for the given text with optional delay between sentences.
+        Args:
+            sentence: The sentence to synthesize.
+
+        Returns:
+            The sample rate, sample width, channel count and raw audio bytes.
+        """
+        audio = self.glados_tts.run_tts(sentence)
+        return audio.frame_rate, audio.sample_width, audio.channels, audio.raw_data
+
+    async def handle_tts_request(
+        self, text: str, delay: float = 250
+    ) -> AsyncIterator[Tuple[int, int, int, bytes]]:
+        """Generate raw audio for the given text, one sentence at a time.
+
+        Synthesis runs on a worker thread so the event loop stays responsive,
+        and the next sentence starts before the current one is yielded, so it
+        overlaps with sending the current audio to the client.
 
         Args:
             text: The text to synthesize.
             delay: The delay between sentences in milliseconds.
 
-        Returns:
-            An AudioSegment containing the synthesized speech.
+        Yields:
+            The sample rate, sample width, channel count and raw audio bytes
+            of each sentence, with silence of the given delay between sentences.
         """
-        sentences = sent_tokenize(text)
+        if not text:
+            return
+
+        sentences = split_sentences(text)
         if not sentences:
-            return AudioSegment.silent(duration=0)
+            return
 
-        audio = self.glados_tts.run_tts(sentences[0])
-        pause = AudioSegment.silent(duration=delay)
+        loop = asyncio.get_running_loop()
+        next_audio = loop.run_in_executor(
+            _TTS_EXECUTOR, self.synthesize_sentence, sentences[0]
+        )
+        try:
+            rate, width, channels, audio_bytes = await next_audio
+            # Built once and reused for every gap between sentences
+            pause = bytes(int(delay * rate / 1000) * width * channels)
+            for sentence in sentences[1:]:
+                next_audio = loop.run_in_executor(
+                    _TTS_EXECUTOR, self.synthesize_sentence, sentence
+                )
+                yield rate, width, channels, audio_bytes
+                # Only send the pause once the next sentence exists
+                next_sentence = await next_audio
+                yield rate, width, channels, pause
+                rate, width, channels, audio_bytes = next_sentence
+
+            yield rate, width, channels, audio_bytes
+        finally:
+            next_audio.cancel()
+
+    async def write_audio(
+        self, rate: int, width: int, channels: int, audio_bytes: bytes
+    ) -> None:
+        """Send raw audio to the client as a series of audio chunks.
 
-        for sentence in sentences[1:]:
-            new_line = self.glados_tts.run_tts(sentence)
-            audio += pause + new_line
+        Args:
+            rate: The sample rate of the audio.
+            width: The sample width of the audio in bytes.
+            channels: The number of audio channels.
+            audio_bytes: The raw audio data.
+        """
+        bytes_per_sample = width * channels
+        bytes_per_chunk = bytes_per_sample * self.cli_args.samples_per_chunk
 
-        return audio
+        # Split into chunks and send; memoryview slices avoid copying the audio
+        audio_view = memoryview(audio_bytes)
+        for offset in range(0, len(audio_view), bytes_per_chunk):
+            chunk = audio_view[offset: offset + bytes_per_chunk]
+            await self.write_event(
+                AudioChunk(
+                    audio=chunk,
+                    rate=rate,
+                    width=width,
+                    channels=channels,
+                ).event(),
+            )
 
     async def handle_event(self, event: Event) -> bool:
         """Handle incoming events from the client.
@@ -89,53 +191,42 @@ class GladosEventHandler(AsyncEventHandler):
         # Join multiple lines
         text = " ".join(raw_text.strip().splitlines())
 
-        if self.cli_args.auto_punctuation and text:
+        if self._auto_punctuation and text:
             # Add automatic punctuation (important for some voices)
-            if not any(text.endswith(punc_char) for punc_char in self.cli_args.auto_punctuation):
-                text += self.cli_args.auto_punctuation[0]
+            if not text.endswith(self._auto_punctuation):
+                text += self._auto_punctuation[0]
 
         # Actual TTS synthesis
         _LOGGER.debug("Synthesize: raw_text='%s', text='%s'", raw_text, text)
 
-        if text:
-            try:
-                audio = self.handle_tts_request(text)
-            except Exception as e:
-                _LOGGER.exception("Error during TTS synthesis: %s", e)
-                # Optionally, send an error message to the client
-                return True
-        else:
-            audio = AudioSegment.silent(duration=0)
-
-        rate = audio.frame_rate
-        width = audio.sample_width
-        channels = audio.channels
-
-        await self.write_event(
-            AudioStart(
-                rate=rate,
-                width=width,
-                channels=channels,
-            ).event(),
-        )
-
-        # Audio data
-        audio_bytes = audio.raw_data
-        bytes_per_sample = width * channels
-        bytes_per_chunk = bytes_per_sample * self.cli_args.samples_per_chunk
-        num_chunks = (len(audio_bytes) + bytes_per_chunk - 1) // bytes_per_chunk  # Ceiling division
-
-        # Split into chunks and send
-        for i in range(num_chunks):
-            offset = i * bytes_per_chunk
-            chunk = audio_bytes[offset: offset + bytes_per_chunk]
+        # Stream each sentence as soon as it is synthesized
+        audio_started = False
+        async with aclosing(self.handle_tts_request(text)) as audio_stream:
+            while True:
+                try:
+                    rate, width, channels, audio_bytes = await anext(audio_stream)
+                except StopAsyncIteration:
+                    break
+                except Exception as e:
+                    _LOGGER.exception("Error during TTS synthesis: %s", e)
+                    await self.write_event(
+                        Error(text=f"TTS synthesis failed: {e}", code=type(e).__name__).event()
+                    )
+                    if not audio_started:
+                        return True
+                    # Close the audio stream that was already started
+                    break
+
+                if not audio_started:
+                    await self.write_event(get_audio_start_event(rate, width, channels))
+                    audio_started = True
+
+                await self.write_audio(rate, width, channels, audio_bytes)
+
+        if not audio_started:
+            # Nothing to synthesize
             await self.write_event(
-                AudioChunk(
-                    audio=chunk,
-                    rate=rate,
-                    width=width,
-                    channels=channels,
-                ).event(),
+                get_audio_start_event(_DEFAULT_RATE, _DEFAULT_WIDTH, _DEFAULT_CHANNELS)
             )
 
         await self.write_event(AudioStop().event())
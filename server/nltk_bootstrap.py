@@ -0,0 +1,25 @@
+"""Download of the NLTK data used by the server."""
+
+import logging
+
+import nltk
+
+_LOGGER = logging.getLogger(__name__)
+
+# NLTK packages needed for sentence tokenization
+_NLTK_PACKAGES = ("punkt_tab",)
+
+
+def ensure_nltk(debug: bool = False) -> None:
+    """Download any missing NLTK tokenizer data.
+
+    Args:
+        debug: Show NLTK download progress.
+    """
+    for package in _NLTK_PACKAGES:
+        try:
+            nltk.data.find(f"tokenizers/{package}")
+            _LOGGER.debug("NLTK '%s' tokenizer data is already available.", package)
+        except LookupError:
+            _LOGGER.info("Downloading NLTK '%s' tokenizer data...", package)
+            nltk.download(package, quiet=not debug)